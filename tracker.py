@@ -1,128 +1,204 @@
 from __future__ import annotations
 
 import argparse
+import base64
 import csv
+import hashlib
+import heapq
 import os
-import webbrowser
-from dataclasses import dataclass
-from datetime import date, datetime, timedelta
-from typing import Iterable, List, Optional, Sequence, Tuple
+import re
+import sys
+from array import array
+from calendar import monthrange
+from datetime import date, timedelta
+from functools import lru_cache
+from operator import attrgetter, itemgetter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
 
 
 # ---------- Domain ----------
 
-@dataclass(frozen=True)
-class Trip:
-    """A continuous period abroad (inclusive of both start and end)."""
+class Trip(NamedTuple):
+    """A continuous period abroad (inclusive of both start and end).
+
+    Construction does not validate; build trips from user input with make_trip.
+    """
 
     start: date
     end: date
 
-    def __post_init__(self) -> None:
-        if self.end < self.start:
-            raise ValueError("Trip end date cannot be before start date")
+
+def make_trip(start: date, end: date) -> Trip:
+    if end < start:
+        raise ValueError("Trip end date cannot be before start date")
+    return Trip(start, end)
 
 
 Period = Tuple[date, date]
 
 
+# One pattern for all accepted formats, mirroring strptime's "%Y-%m-%d", "%Y/%m/%d",
+# "%d-%m-%Y" and "%d/%m/%Y" with a single separator used throughout. The field patterns
+# are strptime's own: %Y takes any four Unicode digits, %m only ASCII digits, and %d an
+# ASCII leading digit (a Unicode second digit is allowed after 1 or 2).
+_YEAR = r"\d\d\d\d"
+_MONTH = r"1[0-2]|0[1-9]|[1-9]"
+_DAY = r"3[01]|[12]\d|0[1-9]|[1-9]| [1-9]"
+_DATE_RE = re.compile(
+    rf"({_YEAR})([-/])({_MONTH})\2({_DAY})"  # year first
+    rf"|({_DAY})([-/])({_MONTH})\6({_YEAR})"  # day first
+)
+
+
+@lru_cache(maxsize=None)
 def parse_date(value: str) -> date:
     value = value.strip()
-    # Accept common separators
-    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d"):
+    # Fast path for plain YYYY-MM-DD; the shape check keeps fromisoformat from
+    # accepting the other ISO forms it knows (e.g. 20240401, 2024-W01-1)
+    if len(value) == 10 and value[4] == value[7] == "-":
         try:
-            return datetime.strptime(value, fmt).date()
+            return date.fromisoformat(value)
         except ValueError:
-            continue
+            pass
+    m = _DATE_RE.fullmatch(value)
+    if m:
+        if m.group(1) is not None:
+            y, mo, d = m.group(1, 3, 4)
+        else:
+            d, mo, y = m.group(5, 7, 8)
+        try:
+            return date(int(y), int(mo), int(d))
+        except ValueError:
+            pass  # e.g. 2024-02-30
     raise ValueError(f"Invalid date format: {value}. Use YYYY-MM-DD (e.g., 2024-04-01)")
 
 
-def clamp_trip_to_period(trip: Trip, period: Period) -> Optional[Trip]:
-    p_start, p_end = period
-    start = max(trip.start, p_start)
-    end = min(trip.end, p_end)
-    if end < start:
-        return None
-    return Trip(start, end)
-
+def merged_trip_offsets(trips: Iterable[Trip], period: Period) -> Tuple[array, array]:
+    """Clamp trips to the period and merge overlapping or contiguous ones in one pass.
 
-def merge_overlapping_trips(trips: Sequence[Trip]) -> List[Trip]:
-    if not trips:
-        return []
-    trips_sorted = sorted(trips, key=lambda t: t.start)
-    merged: List[Trip] = []
-    cur = trips_sorted[0]
-    for t in trips_sorted[1:]:
-        if t.start <= (cur.end + timedelta(days=1)):
-            # Overlapping or contiguous; merge
-            cur = Trip(cur.start, max(cur.end, t.end))
+    Returns parallel arrays of inclusive start/end day offsets from the period start,
+    sorted and non-overlapping; trips entirely outside the period are dropped.
+    """
+    p_start, p_end = period
+    base = p_start.toordinal()
+    last = p_end.toordinal() - base
+    # Clamping keeps the start order, so one sort up front is enough. Output is
+    # preallocated at input size, filled through a write index j, then truncated.
+    trips_sorted = sorted(trips, key=attrgetter("start"))
+    starts = array("i", [0]) * len(trips_sorted)
+    ends = array("i", [0]) * len(trips_sorted)
+    j = -1
+    for trip in trips_sorted:
+        s = max(trip.start.toordinal() - base, 0)
+        e = min(trip.end.toordinal() - base, last)
+        if e < s:
+            continue
+        if j >= 0 and s <= ends[j] + 1:
+            if e > ends[j]:
+                ends[j] = e
         else:
-            merged.append(cur)
-            cur = t
-    merged.append(cur)
-    return merged
+            j += 1
+            starts[j] = s
+            ends[j] = e
+    del starts[j + 1:]
+    del ends[j + 1:]
+    return starts, ends
 
 
-def build_abroad_day_flags(trips: Sequence[Trip], period: Period) -> Tuple[List[int], date]:
+def build_abroad_day_flags(trips: Sequence[Trip], period: Period) -> Tuple[bytearray, date]:
     """Return an array flags[i] = 1 if the i-th day in [period_start, period_end] is abroad.
 
-    Also returns the period_start to map indices back to dates.
+    Flags are stored one byte per day and each merged trip is filled with a single
+    slice assignment. Also returns the period_start to map indices back to dates.
     """
     p_start, p_end = period
-    total_days = (p_end - p_start).days + 1
-    flags = [0] * total_days
-    if not trips:
-        return flags, p_start
-
-    for trip in trips:
-        s = max(trip.start, p_start)
-        e = min(trip.end, p_end)
-        if e < s:
-            continue
-        si = (s - p_start).days
-        ei = (e - p_start).days
-        for i in range(si, ei + 1):
-            flags[i] = 1
+    flags = bytearray((p_end - p_start).days + 1)
+    for si, ei in zip(*merged_trip_offsets(trips, period)):
+        flags[si:ei + 1] = b"\x01" * (ei - si + 1)
     return flags, p_start
 
 
-def sum_in_window(flags: Sequence[int], start_index: int, window_days: int) -> int:
-    n = len(flags)
-    if n == 0:
-        return 0
-    end = min(start_index + window_days - 1, n - 1)
-    prefix = [0] * (n + 1)
-    for i, v in enumerate(flags):
-        prefix[i + 1] = prefix[i] + v
-    return prefix[end + 1] - prefix[start_index]
+def sum_in_window(flags: bytearray, start_index: int, window_days: int) -> int:
+    # Flags are 0/1 bytes, so counting the set bytes in the range is the window sum
+    end = min(start_index + window_days, len(flags))
+    return flags.count(1, start_index, end)
 
 
-def rolling_window_violations(
-    abroad_flags: Sequence[int],
+def sweep_violations(
+    starts: Sequence[int],
+    ends: Sequence[int],
+    total_days: int,
     window_days: int,
     max_allowed: int,
-) -> List[Tuple[int, int, int]]:
-    """Find windows where sum(flags[i..j]) > max_allowed.
+) -> Tuple[List[Tuple[int, int, int]], Optional[Tuple[int, int, int]]]:
+    """Find windows where the abroad days exceed max_allowed, from merged ranges directly.
 
-    Returns list of tuples: (start_index, end_index_inclusive, abroad_days_in_window)
-    where end_index = min(start_index + window_days - 1, len(flags)-1).
-    """
-    n = len(abroad_flags)
-    if n == 0:
-        return []
+    Each violation is (start_index, end_index_inclusive, abroad_days_in_window) with
+    end_index = min(start_index + window_days - 1, total_days - 1), in start order.
 
-    # Prefix sum for O(1) range sums
-    prefix = [0] * (n + 1)
-    for i, v in enumerate(abroad_flags):
-        prefix[i + 1] = prefix[i] + v
+    `starts`/`ends` are inclusive day offsets as returned by merged_trip_offsets: within
+    [0, total_days), sorted and non-overlapping. Moving the window start by one day
+    changes its sum by (day entering ? 1 : 0) - (day leaving ? 1 : 0); that slope only
+    changes at range boundaries, so the window sum is linear between them and the
+    violating starts of each segment can be found arithmetically without a per-day array.
+
+    Returns (violations, worst), where worst is the earliest violation with the most
+    abroad days, or None if there are no violations.
+    """
+    n = total_days
+    last = min(window_days, n) - 1  # end index of the first window
+
+    abroad_days = 0
+    slope_changes: Dict[int, int] = {}
+    for a, b in zip(starts, ends):
+        if a <= last:
+            abroad_days += min(b, last) - a + 1
+        # Leaving side: slope is -1 while the day dropped (window start) is abroad
+        # Entering side: slope is +1 while the day added (start + window_days) is abroad
+        for pos, delta in (
+            (a, -1),
+            (b + 1, 1),
+            (a - window_days, 1),
+            (b - window_days + 1, -1),
+        ):
+            if pos < n:
+                pos = max(pos, 0)
+                slope_changes[pos] = slope_changes.get(pos, 0) + delta
 
     violations: List[Tuple[int, int, int]] = []
-    for start in range(n):
-        end = min(start + window_days - 1, n - 1)
-        abroad_days = prefix[end + 1] - prefix[start]
-        if abroad_days > max_allowed:
-            violations.append((start, end, abroad_days))
-    return violations
+    worst: Optional[Tuple[int, int, int]] = None
+
+    def emit(p: int, q: int, slope: int) -> None:
+        nonlocal worst
+        # Window sum over starts p..q-1 is abroad_days + slope * (s - p)
+        lo, hi = p, q - 1
+        if slope > 0:
+            lo = max(lo, p + max_allowed - abroad_days + 1)
+        elif slope < 0:
+            hi = min(hi, p + abroad_days - max_allowed - 1)
+        elif abroad_days <= max_allowed:
+            return
+        if lo > hi:
+            return
+        for start in range(lo, hi + 1):
+            violations.append(
+                (start, min(start + window_days - 1, n - 1), abroad_days + slope * (start - p))
+            )
+        # The sum is monotonic within a segment, so its peak is at one end
+        peak = hi if slope > 0 else lo
+        peak_days = abroad_days + slope * (peak - p)
+        if worst is None or peak_days > worst[2]:
+            worst = (peak, min(peak + window_days - 1, n - 1), peak_days)
+
+    slope = slope_changes.pop(0, 0)
+    p = 0
+    for q in sorted(slope_changes):
+        emit(p, q, slope)
+        abroad_days += slope * (q - p)
+        slope += slope_changes[q]
+        p = q
+    emit(p, n, slope)
+    return violations, worst
 
 
 def check_abroad_days(
@@ -137,29 +213,60 @@ def check_abroad_days(
     (window_start_date, window_end_date, abroad_days_in_window). The worst_window is the one with 
     the most abroad days, or None if compliant.
     """
-    # Clamp and merge trips to the assessment period first
-    clamped = [t for t in (clamp_trip_to_period(t, assessment_period) for t in trips) if t]
-    merged = merge_overlapping_trips(clamped)
+    # Work on day offsets from the period start: clamp and merge in one pass, then scan
+    base, p_end = assessment_period
+    starts, ends = merged_trip_offsets(trips, assessment_period)
 
-    flags, base = build_abroad_day_flags(merged, assessment_period)
-    raw = rolling_window_violations(flags, window_days, max_allowed)
+    # Merged ranges are disjoint, so if all of them together fit within the limit no
+    # window can exceed it; skip the scan altogether.
+    if sum(ends) - sum(starts) + len(starts) <= max_allowed:
+        return True, [], None
 
+    total_days = (p_end - base).days + 1
+    raw, worst = sweep_violations(starts, ends, total_days, window_days, max_allowed)
+
+    base_ord = base.toordinal()
     humanized: List[Tuple[date, date, int]] = []
     for si, ei, days_in_window in raw:
-        humanized.append((base + timedelta(days=si), base + timedelta(days=ei), days_in_window))
+        humanized.append((date.fromordinal(base_ord + si), date.fromordinal(base_ord + ei), days_in_window))
 
-    # Find the worst window (highest abroad days)
+    # The sweep already tracked the worst window (highest abroad days)
     worst_window = None
-    if humanized:
-        worst_window = max(humanized, key=lambda w: w[2])
+    if worst is not None:
+        si, ei, days_in_window = worst
+        worst_window = (date.fromordinal(base_ord + si), date.fromordinal(base_ord + ei), days_in_window)
 
     return (len(humanized) == 0), humanized, worst_window
 
 
+def coalesce_violations(
+    violations: Sequence[Tuple[date, date, int]],
+) -> List[Tuple[date, date, int]]:
+    """Collapse runs of violating windows with consecutive start dates to their worst window.
+
+    Expects windows ordered by start date, as returned by check_abroad_days. Ties within a
+    run keep the earliest window.
+    """
+    peaks: List[Tuple[date, date, int]] = []
+    prev_ord = None
+    for w in violations:
+        start_ord = w[0].toordinal()
+        if prev_ord is not None and start_ord == prev_ord + 1:
+            if w[2] > peaks[-1][2]:
+                peaks[-1] = w
+        else:
+            peaks.append(w)
+        prev_ord = start_ord
+    return peaks
+
+
 # ---------- Visualization ----------
 
+_DAY_STRS = tuple(f"{i:02d}" for i in range(32))
+
+
 def render_terminal_grid(
-    flags: Sequence[int],
+    flags: bytearray,
     base_date: date,
     period_end: date,
     today: date,
@@ -180,289 +287,294 @@ def render_terminal_grid(
     BOLD = "\x1b[1m"
     RESET = "\x1b[0m"
 
+    # Worst window as day offsets; (0, -1) matches nothing
+    worst_si, worst_ei = (
+        ((worst_window[0] - base_date).days, (worst_window[1] - base_date).days) if worst_window else (0, -1)
+    )
+
+    # Day offsets of today and of the last day shown
+    today_idx = (today - base_date).days
+    last_idx = (period_end - base_date).days
+
+    # Collect the whole grid and write it once instead of a print() per day
+    out: List[str] = []
+    append = out.append
+
     # Iterate months
     cur = date(base_date.year, base_date.month, 1)
     while cur <= period_end:
-        # Determine month range within assessment
-        next_month = (cur.replace(day=28) + timedelta(days=4)).replace(day=1)
-        month_start = max(cur, base_date)
-        month_end = min(next_month - timedelta(days=1), period_end)
+        first_wd, num_days = monthrange(cur.year, cur.month)  # Monday=0..Sunday=6
         # Header
-        print(f"\n{cur.strftime('%B %Y')}")
+        append(f"\n{cur.strftime('%B %Y')}\n")
         # Weekday header
-        print("Mo Tu We Th Fr Sa Su")
-        # Leading spaces
-        first_weekday = (month_start.weekday() + 1) % 7  # Monday=0 -> Monday=1 style
-        # Compute column offset: Monday=0..Sunday=6
-        monday_based = month_start.weekday()  # 0..6
-        col = monday_based
-        # Print leading blanks
-        if month_start.day != 1:
-            # Need to align to the correct weekday for day 1
-            first_of_month = month_start.replace(day=1)
-            col = first_of_month.weekday()
-            print("   " * col, end="")
-        else:
-            print("   " * col, end="")
-
-        d = month_start
-        while d <= month_end:
-            idx = (d - base_date).days
+        append("Mo Tu We Th Fr Sa Su\n")
+        # Leading blanks align to the weekday of the 1st
+        append("   " * first_wd)
+
+        # Walk day numbers within the assessment period; idx of day 1 may be negative
+        base_idx = (cur - base_date).days - 1
+        for day in range(max(1, -base_idx), min(num_days, last_idx - base_idx) + 1):
+            idx = base_idx + day
             # choose color
-            if d > today:
+            if idx > today_idx:
                 color = BLACK
             else:
                 color = RED if flags[idx] == 1 else GREEN
-            
+
             # Highlight worst window period
-            if worst_window and worst_window[0] <= d <= worst_window[1]:
+            if worst_si <= idx <= worst_ei:
                 color = YELLOW
-            
-            # print two-char day as colored block with day number
-            print(f"{color}{d.day:02d}{RESET} ", end="")
-            if d.weekday() == 6:  # Sunday -> newline
-                print()
-            d += timedelta(days=1)
-        print()
-        cur = next_month
+
+            # two-char day as colored block with day number
+            append(color)
+            append(_DAY_STRS[day])
+            append(RESET)
+            append(" ")
+            if (first_wd + day) % 7 == 0:  # Sunday -> newline
+                append("\n")
+        append("\n")
+        cur += timedelta(days=num_days)
+    sys.stdout.write("".join(out))
+
+
+_BIT_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+
+_MONTH_NAMES = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+# Static parts of the HTML page. render_html_grid writes these as-is around the calendar
+# grid and the per-call data at the top of the script.
+_HTML_HEAD = (
+    "<title>Abroad Days Grid</title>"
+    "<style>\n"
+    ":root{--size:12px;--gap:1px;}\n"
+    "body{font-family:system-ui,Segoe UI,Arial,sans-serif;padding:16px;}\n"
+    ".legend{margin-bottom:12px} .legend span{display:inline-block;margin-right:12px}\n"
+    ".sw{display:inline-block;width:12px;height:12px;margin-right:6px;vertical-align:middle;}\n"
+    ".sw.home{background:#2ecc71} .sw.abroad{background:#e74c3c} .sw.future{background:#d9d9d9} .sw.planned{background:#f39c12} \n"
+    ".outer{display:grid;grid-template-columns:56px repeat(12, 1fr);gap:4px;align-items:start;}\n"
+    ".year{font-weight:700;align-self:center;}\n"
+    ".month{border:1px solid #eee;padding:4px;border-radius:4px;}\n"
+    ".month-name{font-size:11px;color:#333;margin-bottom:2px;text-align:center;}\n"
+    ".mini{display:grid;grid-template-columns:repeat(7,var(--size));grid-auto-rows:var(--size);gap:var(--gap);justify-content:center;}\n"
+    ".cell{width:var(--size);height:var(--size);box-sizing:border-box;position:relative;}\n"
+    ".home{background:#2ecc71} .abroad{background:#e74c3c} .future{background:#d9d9d9} .planned{background:#f39c12} .worst{border:2px solid #f1c40f} \n"
+    ".empty{background:transparent} \n"
+    ".months-header{display:grid;grid-template-columns:56px repeat(12, 1fr);gap:4px;margin-bottom:4px;color:#555;font-size:11px;}\n"
+    ".months-header div{ text-align:center; white-space:nowrap }\n"
+    ".panel{margin:12px 0;display:flex;gap:12px;align-items:center;flex-wrap:wrap;}\n"
+    ".panel input[type=date]{padding:4px 6px} .panel .metric{font-size:13px;color:#333}\n"
+    ".status-badge{padding:6px 10px;border-radius:999px;font-weight:700;color:#fff} \n"
+    ".ok{background:#27ae60} .notok{background:#c0392b}\n"
+    ".plans{margin:10px 0;} .plans h3{margin:8px 0 6px 0;font-size:14px} .plans table{border-collapse:collapse;width:100%;max-width:760px} .plans th,.plans td{border-bottom:1px solid #eee;padding:4px 6px;font-size:12px;text-align:left} .plans input[type=date]{padding:2px 4px;font-size:12px} .plans button{padding:4px 8px;font-size:12px}\n"
+    ".sw.worst{background:#f1c40f}\n"
+    "</style>"
+    "</head><body>"
+    "<h2>Abroad Days</h2>"
+    "<div class='legend'>"
+    "<span><span class='sw home'></span>Home</span>"
+    "<span><span class='sw abroad'></span>Abroad (past/present)</span>"
+    "<span><span class='sw planned'></span>Abroad (future)</span>"
+    "<span><span class='sw future'></span>Future (home)</span>"
+    "<span><span class='sw worst'></span>Worst 12-month period</span>"
+    "</div>"
+    # Interaction panel
+    "<div class='panel'>"
+    "<span id='status' class='status-badge ok'>COMPLIANT</span>"
+    "<span class='metric' id='worst'></span>"
+    "<div style='width:100%'><small id='worstPeriod' class='metric'></small></div>"
+    "<label>Query start: <input id='qstart' type='date'></label>"
+    "<span class='metric' id='remaining'></span>"
+    "<label style='margin-left:12px'>Add trip: <input id='pstart' type='date'> – <input id='pend' type='date'></label>"
+    "<button id='addPlan' type='button'>Add trip</button>"
+    "<button id='clearPlan' type='button'>Clear added trips</button>"
+    "</div>"
+    # Added trips list container
+    "<div class='plans'><h3>Added trips</h3><table id='plansTable'><thead><tr><th>#</th><th>Start</th><th>End</th><th>Days</th><th></th></tr></thead><tbody></tbody></table></div>"
+    # Month header row
+    "<div class='months-header' id='monthsHeader'>"
+    "<div></div>"  # placeholder over year column
+    "<div>Jan</div><div>Feb</div><div>Mar</div><div>Apr</div><div>May</div><div>Jun</div>"
+    "<div>Jul</div><div>Aug</div><div>Sep</div><div>Oct</div><div>Nov</div><div>Dec</div>"
+    "</div>"
+)
+
+_HTML_SCRIPT = (
+    "let plannedRanges = []; let nextPlanId = 1;\n"
+    "function mergeRanges(ranges){ if(ranges.length===0) return []; ranges = ranges.slice().sort((a,b)=>a.startIdx-b.startIdx); const out=[{...ranges[0]}]; for(let k=1;k<ranges.length;k++){ const r=ranges[k]; const cur=out[out.length-1]; if(r.startIdx <= cur.endIdx + 1){ cur.endIdx = Math.max(cur.endIdx, r.endIdx); } else { out.push({...r}); } } return out; }\n"
+    "function sumRange(arr, start, end){let s=0; for(let i=start;i<=end;i++){s+=arr[i]||0;} return s;}\n"
+    "// Sliding window: add the day entering, drop the day leaving; O(n) instead of O(n*windowDays)\n"
+    "function bestWindowRange(){let n=flags.length;let best=-1,bStart=0,bEnd=-1;let sum=0;for(let j=0;j<Math.min(n,windowDays);j++){sum+=(flags[j]||0)|(planned[j]||0);}for(let i=0;i<n;i++){if(sum>best){best=sum;bStart=i;bEnd=Math.min(n-1,i+windowDays-1);}sum-=(flags[i]||0)|(planned[i]||0);if(i+windowDays<n){sum+=(flags[i+windowDays]||0)|(planned[i+windowDays]||0);}}return {start:bStart,end:bEnd,sum:best};}\n"
+    "function remainingFrom(startIdx){let n=flags.length; let e=Math.min(n-1,startIdx+windowDays-1); let sum=0; for(let j=startIdx;j<=e;j++){sum+=(flags[j]||0) | (planned[j]||0);} return Math.max(0, maxDays - sum);}\n"
+    "function idxFromDate(d){ return Math.floor((d.getTime() - baseMs)/MS_PER_DAY); }\n"
+    "function dateFromIdx(i){ return new Date(baseMs + i*MS_PER_DAY); }\n"
+    "function ensureSizeForDate(d){ const need = idxFromDate(d)+1; if(need>flags.length){ const nf = new Uint8Array(need); nf.set(flags); flags = nf; const np = new Uint8Array(need); np.set(planned); planned = np; } }\n"
+    "function recalcPlannedFromRanges(){ plannedRanges = mergeRanges(plannedRanges); planned.fill(0); for(const r of plannedRanges){ for(let i=r.startIdx;i<=r.endIdx;i++){ planned[i]=1; } } }\n"
+    "function renderPlansTable(){ const tbody = document.querySelector('#plansTable tbody'); tbody.innerHTML=''; plannedRanges.sort((a,b)=>a.startIdx-b.startIdx); let i=1; for(const r of plannedRanges){ const tr=document.createElement('tr'); const sd = dateFromIdx(r.startIdx).toISOString().slice(0,10); const ed = dateFromIdx(r.endIdx).toISOString().slice(0,10); tr.innerHTML = `<td>${i}</td><td><input type='date' data-id='${r.id}' data-role='start' value='${sd}'></td><td><input type='date' data-id='${r.id}' data-role='end' value='${ed}'></td><td>${(r.endIdx-r.startIdx+1)}</td><td><button data-id='${r.id}' data-role='remove'>Remove</button></td>`; tbody.appendChild(tr); i++; } }\n"
+    "function attachPlansTableHandlers(){ const tbody = document.querySelector('#plansTable tbody'); tbody.addEventListener('input', (e)=>{ const t=e.target; if(!(t instanceof HTMLInputElement)) return; const id=parseInt(t.getAttribute('data-id')); const role=t.getAttribute('data-role'); const val=t.value; const r = plannedRanges.find(x=>x.id===id); if(!r||!val) return; const d=new Date(val); if(role==='start'){ r.startIdx = Math.min(r.endIdx, Math.max(0, idxFromDate(d))); } else if(role==='end'){ r.endIdx = Math.max(r.startIdx, Math.max(0, idxFromDate(d))); } recalcPlannedFromRanges(); const lastYear = computeLastRelevantYear(); ensureRenderedUntil(lastYear); trimRenderedTo(lastYear); applyClasses(); updateMetrics(); renderPlansTable(); }); tbody.addEventListener('click',(e)=>{ const btn = e.target.closest('button[data-role=remove]'); if(!btn) return; const id=parseInt(btn.getAttribute('data-id')); plannedRanges = plannedRanges.filter(x=>x.id!==id); recalcPlannedFromRanges(); const lastYear = computeLastRelevantYear(); trimRenderedTo(lastYear); applyClasses(); updateMetrics(); renderPlansTable(); }); }\n"
+    "function trimRenderedTo(year){ const outer = document.getElementById('outer'); let currentLast = parseInt(outer.getAttribute('data-last-year')); while(currentLast>year){\n"
+    "  for(let i=0;i<13;i++){ const lastChild = outer.lastElementChild; if(lastChild) outer.removeChild(lastChild); }\n"
+    "  currentLast -= 1; outer.setAttribute('data-last-year', String(currentLast));\n"
+    "} }\n"
+    "function monthCells(y,m,n){ const t0 = Date.UTC(y, m-1, 1); const lastDay = new Date(Date.UTC(y, m, 0)).getUTCDate(); const firstIdx = Math.round((t0 - baseMs)/MS_PER_DAY); const prefix = `${y}-${String(m).padStart(2,'0')}-`; let html = \"<div class='cell empty'></div>\".repeat((new Date(t0).getUTCDay()+6)%7); for(let day=1; day<=lastDay; day++){ const idx = firstIdx + day - 1; html += (idx>=0 && idx<n) ? `<div class='cell' data-idx='${idx}' title='${prefix}${String(day).padStart(2,'0')}'></div>` : \"<div class='cell empty'></div>\"; } return html; }\n"
+    "function buildMonth(y,m,name){ const month = document.createElement('div'); month.className='month'; const title = document.createElement('div'); title.className='month-name'; title.textContent=name; const mini = document.createElement('div'); mini.className='mini'; mini.innerHTML = monthCells(y, m, Infinity); month.appendChild(title); month.appendChild(mini); return month;}\n"
+    "function fillMonths(){ const n = flags.length; document.querySelectorAll('.mini[data-year]').forEach(mini => { mini.innerHTML = monthCells(parseInt(mini.getAttribute('data-year')), parseInt(mini.getAttribute('data-month')), n); }); }\n"
+    "function appendYear(y){ const outer = document.getElementById('outer'); const months = ['Jan','Feb','Mar','Apr','May','Jun','Jul','Aug','Sep','Oct','Nov','Dec']; const yearDiv = document.createElement('div'); yearDiv.className='year'; yearDiv.textContent=String(y); outer.appendChild(yearDiv); for(let m=1;m<=12;m++){ outer.appendChild(buildMonth(y,m,months[m-1])); } }\n"
+    "function ensureRenderedUntil(year){ const outer = document.getElementById('outer'); const currentLastYear = parseInt(outer.getAttribute('data-last-year')); if(year<=currentLastYear) return; for(let y=currentLastYear+1; y<=year; y++){ appendYear(y); } outer.setAttribute('data-last-year', String(year)); }\n"
+    "function computeLastRelevantYear(){ let last = -1; for(let i=0;i<flags.length;i++){ if( (flags[i]|planned[i])===1) last = i; } if(last<0) return Math.min(periodEnd.getFullYear(), new Date().getFullYear()); const d = dateFromIdx(last); return Math.min(periodEnd.getFullYear(), d.getFullYear()); }\n"
+    "function fmt(d){return new Date(d).toISOString().slice(0,10);}\n"
+    "function updateMetrics(){\n"
+    "  const r = bestWindowRange(); const w = Math.max(0, r.sum);\n"
+    "  document.getElementById('worst').textContent = `Worst 12-month: ${w} days`;\n"
+    "  const badge = document.getElementById('status'); const notok = w>maxDays; badge.textContent = notok ? 'NOT COMPLIANT' : 'COMPLIANT'; badge.className = 'status-badge ' + (notok ? 'notok' : 'ok');\n"
+    "  const qs = document.getElementById('qstart').value;\n"
+    "  if(qs){ const idx = idxFromDate(new Date(qs)); if(idx>=0){ const rem = remainingFrom(idx); document.getElementById('remaining').textContent = `Remaining from ${qs}: ${rem}`; } }\n"
+    "  if(r.sum>0){ const s = dateFromIdx(r.start); const e = dateFromIdx(r.end); const el = document.getElementById('worstPeriod'); if(el){ el.textContent = `Worst period: ${fmt(s)} to ${fmt(e)}`; } }\n"
+    "}\n"
+    "function applyClasses(){\n"
+    "  const now = new Date(); now.setHours(0,0,0,0);\n"
+    "  const r = bestWindowRange(); const todayIdx = idxFromDate(now);\n"
+    "  const wStart = r.sum>0 ? r.start : 0, wEnd = r.sum>0 ? r.end : -1;\n"
+    "  document.querySelectorAll('.cell[data-idx]').forEach(el => {\n"
+    "    const i = parseInt(el.getAttribute('data-idx'));\n"
+    "    const abroad = (flags[i]||0)===1;\n"
+    "    const plan = (planned[i]||0)===1;\n"
+    "    let cls = 'home';\n"
+    "    if(abroad || plan){ \n"
+    "      if(i > todayIdx){ cls = 'planned'; } else { cls = 'abroad'; }\n"
+    "    } else {\n"
+    "      if(i > todayIdx){ cls = 'future'; }\n"
+    "    }\n"
+    "    const inWorst = (i>=wStart && i<=wEnd);\n"
+    "    el.className = 'cell ' + cls + (inWorst ? ' worst' : '');\n"
+    "  });\n"
+    "}\n"
+    "function resizeCells(){ const outer = document.getElementById('outer'); const yearCol = 56; const gap = 4; const available = Math.max(0, outer.clientWidth - yearCol - (12-1)*gap); const monthWidth = Math.max(80, Math.floor(available/12)); const size = Math.max(8, Math.min(18, Math.floor((monthWidth - 8 - (7-1)*1)/7))); document.documentElement.style.setProperty('--size', size + 'px'); }\n"
+    "document.addEventListener('click', (e)=>{\n"
+    "  const el = e.target.closest('.cell[data-idx]'); if(!el) return;\n"
+    "  const i = parseInt(el.getAttribute('data-idx'));\n"
+    "  const isAlreadyAbroad = (flags[i]||0)===1;\n"
+    "  const isAlreadyPlanned = (planned[i]||0)===1;\n"
+    "  if(isAlreadyAbroad && !isAlreadyPlanned) return; // cannot toggle base abroad\n"
+    "  planned[i] = planned[i] ? 0 : 1;\n"
+    "  // sync plannedRanges to include this single day toggle as a 1-day range if turning on\n"
+    "  if(planned[i]){ plannedRanges.push({id: nextPlanId++, startIdx:i, endIdx:i}); } else { // turning off: split or shrink overlapping ranges\n"
+    "    const ranges=[]; for(const r of plannedRanges){ if(i<r.startIdx || i>r.endIdx){ ranges.push(r); } else { if(r.startIdx<i) ranges.push({id:r.id, startIdx:r.startIdx, endIdx:i-1}); if(i<r.endIdx) ranges.push({id:r.id, startIdx:i+1, endIdx:r.endIdx}); } } plannedRanges = ranges;\n"
+    "  }\n"
+    "  const lastYear = computeLastRelevantYear(); ensureRenderedUntil(lastYear); trimRenderedTo(lastYear);\n"
+    "  applyClasses(); updateMetrics(); renderPlansTable();\n"
+    "});\n"
+    "document.getElementById('qstart').addEventListener('change', updateMetrics);\n"
+    "document.getElementById('addPlan').addEventListener('click', ()=>{\n"
+    "  const ps = document.getElementById('pstart').value; const pe = document.getElementById('pend').value; if(!ps||!pe) return;\n"
+    "  const ds = new Date(ps); const de = new Date(pe); if(de<ds) return;\n"
+    "  ensureSizeForDate(de);\n"
+    "  const startIdx = Math.max(0, idxFromDate(ds));\n"
+    "  const endIdx = idxFromDate(de);\n"
+    "  plannedRanges.push({id: nextPlanId++, startIdx:startIdx, endIdx:endIdx});\n"
+    "  recalcPlannedFromRanges();\n"
+    "  const lastYear = computeLastRelevantYear(); ensureRenderedUntil(lastYear); trimRenderedTo(lastYear);\n"
+    "  applyClasses(); updateMetrics();\n"
+    "  renderPlansTable();\n"
+    "});\n"
+    "document.getElementById('clearPlan').addEventListener('click', ()=>{\n"
+    "  plannedRanges = []; planned.fill(0); trimRenderedTo(computeLastRelevantYear()); applyClasses(); updateMetrics(); renderPlansTable();\n"
+    "});\n"
+    "window.addEventListener('resize', resizeCells); resizeCells();\n"
+    "fillMonths(); attachPlansTableHandlers(); renderPlansTable(); applyClasses(); updateMetrics();\n"
+    "</script>"
+)
+
+_HTML_END = "</body></html>"
+
+# render_html_grid tags each page with a digest of its inputs and skips regenerating a page
+# that already carries it. The static parts are hashed in here; bump the version whenever
+# the scaffolding or script prologue that render_html_grid writes changes.
+_HTML_FORMAT_VERSION = 1
+_HTML_TEMPLATE_DIGEST = hashlib.blake2b(
+    f"{_HTML_FORMAT_VERSION}\n{_HTML_HEAD}{_HTML_SCRIPT}{_HTML_END}".encode(), digest_size=16
+).digest()
 
 
 def render_html_grid(
-    flags: Sequence[int],
+    flags: bytearray,
     base_date: date,
     period_end: date,
     today: date,
     out_path: str,
-    worst_window: Optional[Tuple[date, date, int]] = None,
-) -> None:
-    """Write an HTML with rows per year and columns per month; each cell shows a mini calendar."""
-
-    def cell_class(d: date) -> str:
-        idx = (d - base_date).days
-        is_abroad = flags[idx] == 1 if 0 <= idx < len(flags) else False
-        
-        # Check if this date is in the worst 12-month window
-        if worst_window and worst_window[0] <= d <= worst_window[1]:
-            if is_abroad:
-                return "abroad worst"  # abroad in worst window
-            elif d > today:
-                return "future worst"  # future in worst window
-            else:
-                return "home worst"  # home in worst window
-        
-        if is_abroad:
-            return "abroad"  # future abroad should still be red
-        if d > today:
-            return "future"
-        return "home"
+) -> bool:
+    """Write an HTML with rows per year and columns per month; each cell shows a mini calendar.
+
+    Only the year/month scaffolding is written here; the page script fills in the day cells
+    from the embedded flags and colours them. Returns False, without writing, when out_path
+    already holds the same page.
+    """
+    # The page depends only on these inputs and the templates; if out_path already holds
+    # a complete page for them, leave it alone. A page cut short lacks the closing tag.
+    key = hashlib.blake2b(
+        _HTML_TEMPLATE_DIGEST
+        + "".join((base_date.isoformat(), period_end.isoformat(), today.isoformat())).encode()
+        + flags,
+        digest_size=16,
+    ).hexdigest()
+    preamble = f"<!DOCTYPE html><html><head><meta charset='utf-8'><meta name='build-key' content='{key}'>"
+    if os.path.exists(out_path):
+        with open(out_path, "rb") as f:
+            head = f.read(len(preamble))
+            f.seek(max(0, os.fstat(f.fileno()).st_size - len(_HTML_END)))
+            if head == preamble.encode() and f.read() == _HTML_END.encode():
+                return False
 
     # Determine years to render initially: only years with non-future days (green or red)
     # or years containing recorded abroad days (even if in the future). Do not add +1.
-    last_abroad_idx = -1
-    for i, v in enumerate(flags):
-        if v == 1:
-            last_abroad_idx = i
+    last_abroad_idx = flags.rfind(1)
     last_abroad_year = (base_date + timedelta(days=last_abroad_idx)).year if last_abroad_idx >= 0 else base_date.year
     initial_end_year = max(min(period_end.year, today.year), last_abroad_year)
     years = list(range(base_date.year, initial_end_year + 1))
 
-    html_parts: List[str] = []
-    html_parts.append("<!DOCTYPE html><html><head><meta charset='utf-8'>")
-    html_parts.append("<title>Abroad Days Grid</title>")
-    html_parts.append(
-        "<style>\n"
-        ":root{--size:12px;--gap:1px;}\n"
-        "body{font-family:system-ui,Segoe UI,Arial,sans-serif;padding:16px;}\n"
-        ".legend{margin-bottom:12px} .legend span{display:inline-block;margin-right:12px}\n"
-        ".sw{display:inline-block;width:12px;height:12px;margin-right:6px;vertical-align:middle;}\n"
-        ".sw.home{background:#2ecc71} .sw.abroad{background:#e74c3c} .sw.future{background:#d9d9d9} .sw.planned{background:#f39c12} \n"
-        ".outer{display:grid;grid-template-columns:56px repeat(12, 1fr);gap:4px;align-items:start;}\n"
-        ".year{font-weight:700;align-self:center;}\n"
-        ".month{border:1px solid #eee;padding:4px;border-radius:4px;}\n"
-        ".month-name{font-size:11px;color:#333;margin-bottom:2px;text-align:center;}\n"
-        ".mini{display:grid;grid-template-columns:repeat(7,var(--size));grid-auto-rows:var(--size);gap:var(--gap);justify-content:center;}\n"
-        ".cell{width:var(--size);height:var(--size);box-sizing:border-box;position:relative;}\n"
-        ".home{background:#2ecc71} .abroad{background:#e74c3c} .future{background:#d9d9d9} .planned{background:#f39c12} .worst{border:2px solid #f1c40f} \n"
-        ".empty{background:transparent} \n"
-        ".months-header{display:grid;grid-template-columns:56px repeat(12, 1fr);gap:4px;margin-bottom:4px;color:#555;font-size:11px;}\n"
-        ".months-header div{ text-align:center; white-space:nowrap }\n"
-        ".panel{margin:12px 0;display:flex;gap:12px;align-items:center;flex-wrap:wrap;}\n"
-        ".panel input[type=date]{padding:4px 6px} .panel .metric{font-size:13px;color:#333}\n"
-        ".status-badge{padding:6px 10px;border-radius:999px;font-weight:700;color:#fff} \n"
-        ".ok{background:#27ae60} .notok{background:#c0392b}\n"
-        ".plans{margin:10px 0;} .plans h3{margin:8px 0 6px 0;font-size:14px} .plans table{border-collapse:collapse;width:100%;max-width:760px} .plans th,.plans td{border-bottom:1px solid #eee;padding:4px 6px;font-size:12px;text-align:left} .plans input[type=date]{padding:2px 4px;font-size:12px} .plans button{padding:4px 8px;font-size:12px}\n"
-        ".sw.worst{background:#f1c40f}\n"
-        "</style>"
-    )
-    html_parts.append("</head><body>")
-    html_parts.append("<h2>Abroad Days</h2>")
-    html_parts.append("<div class='legend'>"
-                     "<span><span class='sw home'></span>Home</span>"
-                     "<span><span class='sw abroad'></span>Abroad (past/present)</span>"
-                     "<span><span class='sw planned'></span>Abroad (future)</span>"
-                     "<span><span class='sw future'></span>Future (home)</span>"
-                     "<span><span class='sw worst'></span>Worst 12-month period</span>"
-                     "</div>")
-    # Interaction panel
-    html_parts.append("<div class='panel'>"
-                     "<span id='status' class='status-badge ok'>COMPLIANT</span>"
-                     "<span class='metric' id='worst'></span>"
-                     "<div style='width:100%'><small id='worstPeriod' class='metric'></small></div>"
-                     "<label>Query start: <input id='qstart' type='date'></label>"
-                     "<span class='metric' id='remaining'></span>"
-                     "<label style='margin-left:12px'>Add trip: <input id='pstart' type='date'> – <input id='pend' type='date'></label>"
-                     "<button id='addPlan' type='button'>Add trip</button>"
-                     "<button id='clearPlan' type='button'>Clear added trips</button>"
-                     "</div>")
-
-    # Added trips list container
-    html_parts.append("<div class='plans'><h3>Added trips</h3><table id='plansTable'><thead><tr><th>#</th><th>Start</th><th>End</th><th>Days</th><th></th></tr></thead><tbody></tbody></table></div>")
-
-    # Month header row
-    month_names = ["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"]
-    html_parts.append("<div class='months-header' id='monthsHeader'>")
-    html_parts.append("<div></div>")  # placeholder over year column
-    for m in month_names:
-        html_parts.append(f"<div>{m}</div>")
-    html_parts.append("</div>")
-
-    html_parts.append(f"<div class='outer' id='outer' data-last-year='{years[-1]}'>")
-    for y in years:
-        # Year label
-        html_parts.append(f"<div class='year'>{y}</div>")
-        # 12 months
-        for m in range(1, 13):
-            # Month boundaries
-            first_of_month = date(y, m, 1)
-            next_month = (first_of_month.replace(day=28) + timedelta(days=4)).replace(day=1)
-            last_of_month = next_month - timedelta(days=1)
-            # Determine overlap with assessment period
-            if last_of_month < base_date or first_of_month > period_end:
-                # outside period -> render empty cell
-                html_parts.append("<div class='month'></div>")
-                continue
-            month_start = max(first_of_month, base_date)
-            month_end = min(last_of_month, period_end)
-
-            html_parts.append("<div class='month'>")
-            html_parts.append(f"<div class='month-name'>{first_of_month.strftime('%b')}</div>")
-            html_parts.append("<div class='mini'>")
-            # Leading blanks to align first day of the month to weekday (Mon=0)
-            col_offset = first_of_month.weekday()
-            for _ in range(col_offset):
-                html_parts.append("<div class='cell empty'></div>")
-            # Days of the month (full month rendered, but only color within period)
-            d = first_of_month
-            while d <= last_of_month:
-                cls = "empty"
-                if base_date <= d <= period_end:
-                    cls = cell_class(d)
-                    idx = (d - base_date).days
-                    html_parts.append(f"<div class='cell {cls}' data-idx='{idx}' title='{d.isoformat()}'></div>")
-                else:
-                    html_parts.append("<div class='cell empty'></div>")
-                d += timedelta(days=1)
-            html_parts.append("</div>")  # mini
-            html_parts.append("</div>")  # month
-    html_parts.append("</div>")  # outer
-
     # Embed data and JS for interactivity
-    total_days = (period_end - base_date).days + 1
-    flags_js = ",".join(str(int(v)) for v in flags)
-    html_parts.append("<script>")
-    html_parts.append(
-        f"const baseDate = new Date('{base_date.isoformat()}');\n"
-        f"let periodEnd = new Date('{period_end.isoformat()}');\n"
-        f"const windowDays = 365;\n"
-        f"const maxDays = 180;\n"
-        f"let flags = new Uint8Array([{flags_js}]);\n"
-        f"let planned = new Uint8Array({total_days});\n"
-        "let plannedRanges = []; let nextPlanId = 1;\n"
-        "function mergeRanges(ranges){ if(ranges.length===0) return []; ranges = ranges.slice().sort((a,b)=>a.startIdx-b.startIdx); const out=[{...ranges[0]}]; for(let k=1;k<ranges.length;k++){ const r=ranges[k]; const cur=out[out.length-1]; if(r.startIdx <= cur.endIdx + 1){ cur.endIdx = Math.max(cur.endIdx, r.endIdx); } else { out.push({...r}); } } return out; }\n"
-        "function sumRange(arr, start, end){let s=0; for(let i=start;i<=end;i++){s+=arr[i]||0;} return s;}\n"
-        "function worstWindow(){let n=flags.length;let best=0;for(let i=0;i<n;i++){let e=Math.min(n-1,i+windowDays-1);let sum=0;for(let j=i;j<=e;j++){sum+=(flags[j]||0)|(planned[j]||0);}if(sum>best)best=sum;}return best;}\n"
-        "function bestWindowRange(){let n=flags.length;let best=-1,bStart=0,bEnd=-1;for(let i=0;i<n;i++){let e=Math.min(n-1,i+windowDays-1);let sum=0;for(let j=i;j<=e;j++){sum+=(flags[j]||0)|(planned[j]||0);}if(sum>best){best=sum;bStart=i;bEnd=e;}}return {start:bStart,end:bEnd,sum:best};}\n"
-         "function remainingFrom(startIdx){let n=flags.length; let e=Math.min(n-1,startIdx+windowDays-1); let sum=0; for(let j=startIdx;j<=e;j++){sum+=(flags[j]||0) | (planned[j]||0);} return Math.max(0, maxDays - sum);}\n"
-        "function idxFromDate(d){ return Math.floor((d - baseDate)/(24*3600*1000)); }\n"
-        "function dateFromIdx(i){ return new Date(baseDate.getTime() + i*24*3600*1000); }\n"
-        "function ensureSizeForDate(d){ const need = idxFromDate(d)+1; if(need>flags.length){ const nf = new Uint8Array(need); nf.set(flags); flags = nf; const np = new Uint8Array(need); np.set(planned); planned = np; } }\n"
-        "function recalcPlannedFromRanges(){ plannedRanges = mergeRanges(plannedRanges); planned.fill(0); for(const r of plannedRanges){ for(let i=r.startIdx;i<=r.endIdx;i++){ planned[i]=1; } } }\n"
-        "function renderPlansTable(){ const tbody = document.querySelector('#plansTable tbody'); tbody.innerHTML=''; plannedRanges.sort((a,b)=>a.startIdx-b.startIdx); let i=1; for(const r of plannedRanges){ const tr=document.createElement('tr'); const sd = dateFromIdx(r.startIdx).toISOString().slice(0,10); const ed = dateFromIdx(r.endIdx).toISOString().slice(0,10); tr.innerHTML = `<td>${i}</td><td><input type='date' data-id='${r.id}' data-role='start' value='${sd}'></td><td><input type='date' data-id='${r.id}' data-role='end' value='${ed}'></td><td>${(r.endIdx-r.startIdx+1)}</td><td><button data-id='${r.id}' data-role='remove'>Remove</button></td>`; tbody.appendChild(tr); i++; } }\n"
-        "function attachPlansTableHandlers(){ const tbody = document.querySelector('#plansTable tbody'); tbody.addEventListener('input', (e)=>{ const t=e.target; if(!(t instanceof HTMLInputElement)) return; const id=parseInt(t.getAttribute('data-id')); const role=t.getAttribute('data-role'); const val=t.value; const r = plannedRanges.find(x=>x.id===id); if(!r||!val) return; const d=new Date(val); if(role==='start'){ r.startIdx = Math.min(r.endIdx, Math.max(0, idxFromDate(d))); } else if(role==='end'){ r.endIdx = Math.max(r.startIdx, Math.max(0, idxFromDate(d))); } recalcPlannedFromRanges(); const lastYear = computeLastRelevantYear(); ensureRenderedUntil(lastYear); trimRenderedTo(lastYear); applyClasses(); updateMetrics(); renderPlansTable(); }); tbody.addEventListener('click',(e)=>{ const btn = e.target.closest('button[data-role=remove]'); if(!btn) return; const id=parseInt(btn.getAttribute('data-id')); plannedRanges = plannedRanges.filter(x=>x.id!==id); recalcPlannedFromRanges(); const lastYear = computeLastRelevantYear(); trimRenderedTo(lastYear); applyClasses(); updateMetrics(); renderPlansTable(); }); }\n"
-        "function trimRenderedTo(year){ const outer = document.getElementById('outer'); let currentLast = parseInt(outer.getAttribute('data-last-year')); while(currentLast>year){\n"
-        "  for(let i=0;i<13;i++){ const lastChild = outer.lastElementChild; if(lastChild) outer.removeChild(lastChild); }\n"
-        "  currentLast -= 1; outer.setAttribute('data-last-year', String(currentLast));\n"
-        "} }\n"
-        "function buildMonth(y,m,name){ const first = new Date(y, m-1, 1); const next = new Date(y, m, 1); const last = new Date(next - 24*3600*1000); const month = document.createElement('div'); month.className='month'; const title = document.createElement('div'); title.className='month-name'; title.textContent=name; const mini = document.createElement('div'); mini.className='mini'; const offset = (first.getDay()+6)%7; for(let i=0;i<offset;i++){ const e=document.createElement('div'); e.className='cell empty'; mini.appendChild(e);} for(let d=new Date(first); d<=last; d.setDate(d.getDate()+1)){ const idx = idxFromDate(d); const cell=document.createElement('div'); cell.className='cell empty'; cell.setAttribute('title', d.toISOString().slice(0,10)); if(d>=baseDate){ cell.setAttribute('data-idx', String(idx)); } mini.appendChild(cell);} month.appendChild(title); month.appendChild(mini); return month;}\n"
-        "function appendYear(y){ const outer = document.getElementById('outer'); const months = ['Jan','Feb','Mar','Apr','May','Jun','Jul','Aug','Sep','Oct','Nov','Dec']; const yearDiv = document.createElement('div'); yearDiv.className='year'; yearDiv.textContent=String(y); outer.appendChild(yearDiv); for(let m=1;m<=12;m++){ outer.appendChild(buildMonth(y,m,months[m-1])); } }\n"
-        "function ensureRenderedUntil(year){ const outer = document.getElementById('outer'); const currentLastYear = parseInt(outer.getAttribute('data-last-year')); if(year<=currentLastYear) return; for(let y=currentLastYear+1; y<=year; y++){ appendYear(y); } outer.setAttribute('data-last-year', String(year)); }\n"
-        "function computeLastRelevantYear(){ let last = -1; for(let i=0;i<flags.length;i++){ if( (flags[i]|planned[i])===1) last = i; } if(last<0) return Math.min(periodEnd.getFullYear(), new Date().getFullYear()); const d = dateFromIdx(last); return Math.min(periodEnd.getFullYear(), d.getFullYear()); }\n"
-        "function fmt(d){return new Date(d).toISOString().slice(0,10);}\n"
-        "function updateMetrics(){\n"
-        "  const w = worstWindow();\n"
-        "  document.getElementById('worst').textContent = `Worst 12-month: ${w} days`;\n"
-        "  const badge = document.getElementById('status'); const notok = w>maxDays; badge.textContent = notok ? 'NOT COMPLIANT' : 'COMPLIANT'; badge.className = 'status-badge ' + (notok ? 'notok' : 'ok');\n"
-        "  const qs = document.getElementById('qstart').value;\n"
-        "  if(qs){ const d = new Date(qs); const idx = Math.floor((d - baseDate)/(24*3600*1000)); if(idx>=0){ const rem = remainingFrom(idx); document.getElementById('remaining').textContent = `Remaining from ${qs}: ${rem}`; } }\n"
-        "  const r = bestWindowRange(); if(r.sum>0){ const s = new Date(baseDate.getTime()+r.start*24*3600*1000); const e = new Date(baseDate.getTime()+r.end*24*3600*1000); const el = document.getElementById('worstPeriod'); if(el){ el.textContent = `Worst period: ${fmt(s)} to ${fmt(e)}`; } }\n"
-        "}\n"
-        "function applyClasses(){\n"
-        "  const now = new Date(); now.setHours(0,0,0,0);\n"
-        "  const r = bestWindowRange();\n"
-        "  document.querySelectorAll('.cell[data-idx]').forEach(el => {\n"
-        "    const i = parseInt(el.getAttribute('data-idx'));\n"
-        "    const abroad = (flags[i]||0)===1;\n"
-        "    const plan = (planned[i]||0)===1;\n"
-        "    const d = new Date(baseDate.getTime() + i*24*3600*1000);\n"
-        "    let cls = 'home';\n"
-        "    if(abroad || plan){ \n"
-        "      if(d > now){ cls = 'planned'; } else { cls = 'abroad'; }\n"
-        "    } else {\n"
-        "      if(d > now){ cls = 'future'; }\n"
-        "    }\n"
-        "    const inWorst = (r.sum>0 && i>=r.start && i<=r.end);\n"
-        "    el.className = 'cell ' + cls + (inWorst ? ' worst' : '');\n"
-        "  });\n"
-        "}\n"
-        "function resizeCells(){ const outer = document.getElementById('outer'); const yearCol = 56; const gap = 4; const available = Math.max(0, outer.clientWidth - yearCol - (12-1)*gap); const monthWidth = Math.max(80, Math.floor(available/12)); const size = Math.max(8, Math.min(18, Math.floor((monthWidth - 8 - (7-1)*1)/7))); document.documentElement.style.setProperty('--size', size + 'px'); }\n"
-        "document.addEventListener('click', (e)=>{\n"
-        "  const el = e.target.closest('.cell[data-idx]'); if(!el) return;\n"
-        "  const i = parseInt(el.getAttribute('data-idx'));\n"
-        "  const isAlreadyAbroad = (flags[i]||0)===1;\n"
-        "  const isAlreadyPlanned = (planned[i]||0)===1;\n"
-        "  if(isAlreadyAbroad && !isAlreadyPlanned) return; // cannot toggle base abroad\n"
-        "  planned[i] = planned[i] ? 0 : 1;\n"
-        "  // sync plannedRanges to include this single day toggle as a 1-day range if turning on\n"
-        "  if(planned[i]){ plannedRanges.push({id: nextPlanId++, startIdx:i, endIdx:i}); } else { // turning off: split or shrink overlapping ranges\n"
-        "    const ranges=[]; for(const r of plannedRanges){ if(i<r.startIdx || i>r.endIdx){ ranges.push(r); } else { if(r.startIdx<i) ranges.push({id:r.id, startIdx:r.startIdx, endIdx:i-1}); if(i<r.endIdx) ranges.push({id:r.id, startIdx:i+1, endIdx:r.endIdx}); } } plannedRanges = ranges;\n"
-        "  }\n"
-        "  const lastYear = computeLastRelevantYear(); ensureRenderedUntil(lastYear); trimRenderedTo(lastYear);\n"
-        "  applyClasses(); updateMetrics(); renderPlansTable();\n"
-        "});\n"
-        "document.getElementById('qstart').addEventListener('change', updateMetrics);\n"
-        "document.getElementById('addPlan').addEventListener('click', ()=>{\n"
-        "  const ps = document.getElementById('pstart').value; const pe = document.getElementById('pend').value; if(!ps||!pe) return;\n"
-        "  const ds = new Date(ps); const de = new Date(pe); if(de<ds) return;\n"
-        "  ensureSizeForDate(de);\n"
-        "  const startIdx = Math.max(0, idxFromDate(ds));\n"
-        "  const endIdx = idxFromDate(de);\n"
-        "  plannedRanges.push({id: nextPlanId++, startIdx:startIdx, endIdx:endIdx});\n"
-        "  recalcPlannedFromRanges();\n"
-        "  const lastYear = computeLastRelevantYear(); ensureRenderedUntil(lastYear); trimRenderedTo(lastYear);\n"
-        "  applyClasses(); updateMetrics();\n"
-        "  renderPlansTable();\n"
-        "});\n"
-        "document.getElementById('clearPlan').addEventListener('click', ()=>{\n"
-        "  plannedRanges = []; planned.fill(0); trimRenderedTo(computeLastRelevantYear()); applyClasses(); updateMetrics(); renderPlansTable();\n"
-        "});\n"
-        "window.addEventListener('resize', resizeCells); resizeCells();\n"
-        "attachPlansTableHandlers(); renderPlansTable(); applyClasses(); updateMetrics();\n"
-    )
-    html_parts.append("</script>")
-    html_parts.append("</body></html>")
+    # Flags travel bit-packed (day i is bit i&7 of byte i>>3) as base64 and are unpacked
+    # into a Uint8Array on load. Packing goes through a '0'/'1' string read as a base-2
+    # int, so it stays in C.
+    packed = int(flags.translate(_BIT_DIGITS)[::-1], 2).to_bytes((len(flags) + 7) // 8, "little")
+    flags_b64 = base64.b64encode(packed).decode("ascii")
 
     with open(out_path, "w", encoding="utf-8") as f:
-        f.write("".join(html_parts))
+        write = f.write
+        write(preamble)
+        write(_HTML_HEAD)
+
+        write(f"<div class='outer' id='outer' data-last-year='{years[-1]}'>")
+        first_month = (base_date.year, base_date.month)
+        last_month = (period_end.year, period_end.month)
+        for y in years:
+            # Year label
+            write(f"<div class='year'>{y}</div>")
+            # 12 months; those outside the assessment period render as empty cells
+            for m, name in enumerate(_MONTH_NAMES, start=1):
+                if (y, m) < first_month or (y, m) > last_month:
+                    write("<div class='month'></div>")
+                else:
+                    write(
+                        f"<div class='month'><div class='month-name'>{name}</div>"
+                        f"<div class='mini' data-year='{y}' data-month='{m}'></div></div>"
+                    )
+        write("</div>")  # outer
+
+        write("<script>")
+        write(
+            f"const baseDate = new Date('{base_date.isoformat()}');\n"
+            "const MS_PER_DAY = 86400000; const baseMs = baseDate.getTime();\n"
+            f"let periodEnd = new Date('{period_end.isoformat()}');\n"
+            f"const windowDays = 365;\n"
+            f"const maxDays = 180;\n"
+            f"const flagBits = Uint8Array.from(atob('{flags_b64}'), c => c.charCodeAt(0));\n"
+            f"let flags = new Uint8Array({len(flags)}); "
+            "for(let i=0;i<flags.length;i++){ flags[i] = (flagBits[i>>3]>>(i&7))&1; }\n"
+            "let planned = new Uint8Array(flags.length);\n"
+        )
+        write(_HTML_SCRIPT)
+        write(_HTML_END)
+    return True
 
 
 def ensure_unique_path(desired_path: str) -> str:
@@ -480,29 +592,44 @@ def ensure_unique_path(desired_path: str) -> str:
 
 # ---------- IO Helpers ----------
 
+def _is_date(value: str) -> bool:
+    try:
+        parse_date(value)
+    except ValueError:
+        return False
+    return True
+
+
 def read_trips_from_csv(path: str) -> List[Trip]:
     trips: List[Trip] = []
     with open(path, newline="", encoding="utf-8") as f:
-        # Try DictReader first (headered), fall back to reader (no header)
-        sample = f.read(1024)
+        # The file is headered unless its first cell is already a date
+        first_row = next(csv.reader([f.readline()]), [])
         f.seek(0)
-        has_header = csv.Sniffer().has_header(sample)
+        has_header = bool(first_row) and not _is_date(first_row[0])
+        reader = csv.reader(f)
         if has_header:
-            reader = csv.DictReader(f)
+            # Column index of every alias present, in fallback order; like DictReader, a
+            # repeated header name refers to its last column
+            col = {name: i for i, name in enumerate(next(reader))}
+            start_cols = [col[n] for n in ("start", "Start", "from", "From") if n in col]
+            end_cols = [col[n] for n in ("end", "End", "to", "To") if n in col]
             for row in reader:
-                start_raw = row.get("start") or row.get("Start") or row.get("from") or row.get("From")
-                end_raw = row.get("end") or row.get("End") or row.get("to") or row.get("To")
+                if not row:
+                    continue
+                # First non-empty aliased cell, as row.get("start") or row.get("Start") or ...
+                start_raw = next((row[i] for i in start_cols if i < len(row) and row[i]), None)
+                end_raw = next((row[i] for i in end_cols if i < len(row) and row[i]), None)
                 if not start_raw or not end_raw:
                     raise ValueError("CSV must have columns 'start' and 'end' (or 'from'/'to')")
-                trips.append(Trip(parse_date(start_raw), parse_date(end_raw)))
+                trips.append(make_trip(parse_date(start_raw), parse_date(end_raw)))
         else:
-            reader2 = csv.reader(f)
-            for idx, row in enumerate(reader2, start=1):
+            for idx, row in enumerate(reader, start=1):
                 if not row:
                     continue
                 if len(row) < 2:
                     raise ValueError(f"CSV row {idx} should have at least 2 columns: start,end")
-                trips.append(Trip(parse_date(row[0]), parse_date(row[1])))
+                trips.append(make_trip(parse_date(row[0]), parse_date(row[1])))
     return trips
 
 
@@ -530,7 +657,7 @@ def read_trips_interactive() -> List[Trip]:
         try:
             s = parse_date(parts[0])
             e = parse_date(parts[1])
-            trips.append(Trip(s, e))
+            trips.append(make_trip(s, e))
         except Exception as ex:  # noqa: BLE001 - provide user-friendly message
             print(f"Error: {ex}")
             continue
@@ -541,6 +668,10 @@ def read_trips_interactive() -> List[Trip]:
 
 DEFAULT_PERIOD: Period = (date(2024, 4, 1), date(2027, 12, 31))
 
+_ANSI_RED = "\033[91m"
+_ANSI_YELLOW_BOLD = "\033[93m\033[1m"
+_ANSI_RESET = "\033[0m"
+
 
 def main(argv: Optional[Sequence[str]] = None) -> int:
     parser = argparse.ArgumentParser(
@@ -640,15 +771,15 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
     # Apply planned trip if provided
     planned: Optional[Trip] = None
     if args.plan_start and args.plan_end:
-        planned = Trip(parse_date(args.plan_start), parse_date(args.plan_end))
+        planned = make_trip(parse_date(args.plan_start), parse_date(args.plan_end))
     elif args.plan_length is not None:
         if args.plan_start:
             start_planned = parse_date(args.plan_start)
         else:
             start_planned = parse_date(args.plan_from) if args.plan_from else date.today()
-        planned = Trip(start_planned, start_planned + timedelta(days=max(0, args.plan_length - 1)))
+        planned = make_trip(start_planned, start_planned + timedelta(days=max(0, args.plan_length - 1)))
     if planned is not None:
-        trips = list(trips) + [planned]
+        trips.append(planned)  # the readers return a fresh list owned by main
 
     is_ok, violations, worst_window = check_abroad_days(
         trips=trips,
@@ -657,26 +788,28 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
         max_allowed=args.max_days,
     )
 
-    print("Compliant:" + (" YES" if is_ok else " \033[91mNOT compliant\033[0m"))
+    # Summary, written in one go; coloured only when stdout is a terminal
+    red, yellow, reset = (_ANSI_RED, _ANSI_YELLOW_BOLD, _ANSI_RESET) if sys.stdout.isatty() else ("", "", "")
+    lines = ["Compliant:" + (" YES" if is_ok else f" {red}NOT compliant{reset}")]
     if worst_window:
         start, end, days = worst_window
-        print(f"\033[93m\033[1mWorst 12-month window: {start} to {end} ({days} abroad days)\033[0m")
+        lines.append(f"{yellow}Worst 12-month window: {start} to {end} ({days} abroad days){reset}")
     if not is_ok:
-        # Show up to 10 violating windows, with the worst first
-        violations_sorted = sorted(violations, key=lambda w: w[2], reverse=True)
-        limit = min(10, len(violations_sorted))
-        print(f"Top {limit} violating windows (start to end: days_abroad):")
-        for ws, we, days in violations_sorted[:limit]:
-            print(f"- {ws.isoformat()} to {we.isoformat()}: {days} days")
+        # Show up to 10 violating periods, with the worst first. Neighbouring windows
+        # overlap almost entirely, so each run of them is reported by its worst window.
+        top = heapq.nlargest(10, coalesce_violations(violations), key=itemgetter(2))
+        lines.append(f"Top {len(top)} violating periods, worst window of each (start to end: days_abroad):")
+        lines.extend(f"- {ws.isoformat()} to {we.isoformat()}: {days} days" for ws, we, days in top)
+    sys.stdout.write("\n".join(lines) + "\n")
+
+    # Per-day flags for the whole period (with planned if any), shared by the query and the grid
+    if args.query_start or args.visualize != "none":
+        flags, base = build_abroad_day_flags(trips, period)
 
     # Remaining days query
     if args.query_start:
         q_start = parse_date(args.query_start)
         window_days = args.window_days
-        # Build flags for the whole period (with planned if any)
-        clamped = [t for t in (clamp_trip_to_period(t, period) for t in trips) if t]
-        merged = merge_overlapping_trips(clamped)
-        flags, base = build_abroad_day_flags(merged, period)
         if q_start < base:
             q_start = base
         q_end = min(q_start + timedelta(days=window_days - 1), period[1])
@@ -687,9 +820,6 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
 
     # Visualization
     if args.visualize != "none":
-        clamped = [t for t in (clamp_trip_to_period(t, period) for t in trips) if t]
-        merged = merge_overlapping_trips(clamped)
-        flags, base = build_abroad_day_flags(merged, period)
         today = date.today()
         if args.visualize == "terminal":
             render_terminal_grid(flags, base, period[1], today, worst_window)
@@ -698,9 +828,13 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
             desired = args.html_out
             if desired != "abroad_days.html" and not args.overwrite:
                 desired = ensure_unique_path(desired)
-            render_html_grid(flags, base, period[1], today, desired, worst_window)
-            print(f"Wrote HTML visualization to {desired}")
+            if render_html_grid(flags, base, period[1], today, desired):
+                print(f"Wrote HTML visualization to {desired}")
+            else:
+                print(f"HTML visualization {desired} is unchanged")
             if args.open_html:
+                import webbrowser  # only needed here; keeps it off the startup path
+
                 try:
                     webbrowser.open(desired)
                 except Exception: